@@ -3,30 +3,38 @@ from __future__ import annotations
 import typer
 import yaml
 from typing import Optional, List
-import pandas as pd
-from .data import ingest_csv, clean, gender_gap, join_external
-from .plots import choropleth, country_trend
-from .models import forecast_country, cluster_countries
-from .utils import to_iso3, read_parquet_safe
 from pathlib import Path
 
+# pandas, plotly, scikit-learn and statsmodels are imported inside the commands
+# that need them so `--help` and light commands start quickly.
+
 app = typer.Typer(add_completion=False)
 
+def _needed_columns(cols: List[str]) -> List[str]:
+    # Parquet is columnar: only read what a command uses, without duplicates
+    return list(dict.fromkeys(cols))
+
 @app.command()
 def ingest(input: str, output: str, config: str):
+    from .data import ingest_csv
+    from .utils import write_parquet
     df = ingest_csv(input, config)
-    df.to_parquet(output, index=False)
+    write_parquet(df, output)
     typer.echo(f"Wrote standardized data -> {output}")
 
 @app.command()
 def clean_data(input: str, output: str):
+    from .data import clean
+    from .utils import read_parquet_safe, write_parquet
     df = read_parquet_safe(input)
     df = clean(df)
-    df.to_parquet(output, index=False)
+    write_parquet(df, output)
     typer.echo(f"Wrote clean data -> {output}")
 
 @app.command("gender-gap")
 def gender_gap_cmd(input: str, output: str):
+    from .data import gender_gap
+    from .utils import read_parquet_safe
     df = read_parquet_safe(input)
     gg = gender_gap(df)
     gg.to_csv(output, index=False)
@@ -34,31 +42,42 @@ def gender_gap_cmd(input: str, output: str):
 
 @app.command("visualize")
 def visualize(input: str, out_html: str, indicator: str = "prevalence_total", year: str = "latest"):
-    df = read_parquet_safe(input)
+    from .plots import choropleth
+    from .utils import read_parquet_safe
+    df = read_parquet_safe(input, columns=_needed_columns(["country", "country_iso3", "year", indicator]))
     fig = choropleth(df, indicator=indicator, year=year)
     fig.write_html(out_html)
     typer.echo(f"Wrote map -> {out_html}")
 
 @app.command("trend")
 def trend(input: str, country_iso3: str, indicator: str, out_html: str):
-    df = read_parquet_safe(input)
+    from .plots import country_trend
+    from .utils import read_parquet_safe
+    df = read_parquet_safe(input, columns=_needed_columns(["country_iso3", "year", indicator]))
     fig = country_trend(df, country_iso3, indicator)
     fig.write_html(out_html)
     typer.echo(f"Wrote trend -> {out_html}")
 
 @app.command("forecast")
 def forecast(input: str, country: str, indicator: str = "prevalence_total", steps: int = 5, out_png: str = "reports/forecast.png"):
-    df = read_parquet_safe(input)
+    import numpy as np
+    import pandas as pd
+    from .models import forecast_country
+    from .utils import parquet_columns, read_parquet_safe, to_iso3
+    # country only feeds the optional name lookup below, so request it only if present
+    optional = ["country"] if "country" in parquet_columns(input) else []
+    df = read_parquet_safe(input, columns=_needed_columns(optional + ["country_iso3", "year", indicator]))
     country_key = country.strip()
     country_iso3 = None
     if "country_iso3" in df.columns:
-        mask_iso = df["country_iso3"].astype(str).str.lower() == country_key.lower()
-        if mask_iso.any():
-            country_iso3 = df.loc[mask_iso, "country_iso3"].iloc[0]
-        else:
-            mask_name = df["country"].astype(str).str.lower() == country_key.lower()
-            if mask_name.any():
-                country_iso3 = df.loc[mask_name, "country_iso3"].iloc[0]
+        iso_idx = pd.Index(df["country_iso3"].dropna().unique())
+        if country_key.upper() in iso_idx:
+            country_iso3 = country_key.upper()
+        elif "country" in df.columns:
+            pairs = df[["country", "country_iso3"]].dropna().drop_duplicates()
+            pairs = pairs.assign(name=pairs["country"].astype(str).str.lower()).drop_duplicates("name")
+            name_to_iso = dict(zip(pairs["name"], pairs["country_iso3"]))
+            country_iso3 = name_to_iso.get(country_key.lower())
     if country_iso3 is None:
         try:
             iso_guess = to_iso3(pd.Series([country_key])).iloc[0]
@@ -73,12 +92,19 @@ def forecast(input: str, country: str, indicator: str = "prevalence_total", step
     # Simple PNG output via plotly for consistency with HTML
     import plotly.express as px
     hist = df[(df["country_iso3"] == country_iso3)][["year", indicator]].dropna().sort_values("year")
-    hist["type"] = "observed"
-    fut2 = fut.rename(columns={indicator:"value"})
-    hist2 = hist.rename(columns={indicator:"value"})
-    hist2["type"] = "observed"
-    fut2["type"] = "forecast"
-    plot_df = pd.concat([hist2, fut2], ignore_index=True, sort=False)
+    # Fill preallocated columns instead of concatenating observed + forecast frames
+    n_hist = len(hist)
+    n = n_hist + len(fut)
+    years = np.empty(n, dtype=np.int32)
+    values = np.empty(n, dtype=np.float32)
+    kinds = np.empty(n, dtype=object)
+    years[:n_hist] = hist["year"].to_numpy(dtype=np.int32)
+    years[n_hist:] = fut["year"].to_numpy(dtype=np.int32)
+    values[:n_hist] = hist[indicator].to_numpy(dtype=np.float32)
+    values[n_hist:] = fut[indicator].to_numpy(dtype=np.float32)
+    kinds[:n_hist] = "observed"
+    kinds[n_hist:] = "forecast"
+    plot_df = pd.DataFrame({"year": years, "value": values, "type": kinds})
     fig = px.line(plot_df, x="year", y="value", color="type", title=f"{indicator} forecast — {country}")
     try:
         fig.write_image(out_png, scale=2)
@@ -97,33 +123,41 @@ def forecast(input: str, country: str, indicator: str = "prevalence_total", step
 
 @app.command("cluster")
 def cluster(input: str, year: str = "latest", k: int = 5, out_csv: str = "reports/clusters.csv", features: List[str] = typer.Option(None)):
-    df = read_parquet_safe(input)
+    from .models import cluster_countries
+    from .utils import read_parquet_safe
     if features is None or len(features) == 0:
         features = ["prevalence_total","prevalence_depression","prevalence_anxiety"]
+    df = read_parquet_safe(input, columns=_needed_columns(["country", "country_iso3", "year"] + list(features)))
     res = cluster_countries(df, year=year, features=features, n_clusters=k)
     res.to_csv(out_csv, index=False)
     typer.echo(f"Wrote clusters -> {out_csv}")
 
 @app.command("join-external")
-def join_external_cmd(base: str, external: str, key: str = "country_iso3 year", out: str = "data/processed/joined.parquet"):
+def join_external_cmd(base: str, external: str, key: str = "country_iso3 year", out: str = "data/processed/joined.parquet", columns: List[str] = typer.Option(None)):
+    import pandas as pd
+    from .data import join_external, read_csv_header, read_csv_columns
+    from .utils import read_parquet_safe, write_parquet
     key_cols = key.split()
     b = read_parquet_safe(base)
-    e = pd.read_csv(external)
+    header = read_csv_header(external)
+    # Normalize year / country key column names in one rename
+    rename_map = {}
+    for c in header:
+        lc = c.lower()
+        target = "year" if lc == "year" else "country_iso3" if lc in {"iso_code", "iso3", "code"} else None
+        if target and target not in header and target not in rename_map.values():
+            rename_map[c] = target
+    # With --columns, only the join keys and those columns are parsed
+    usecols = None
+    if columns:
+        usecols = [c for c in header if rename_map.get(c, c) in key_cols or c in columns]
+    e = read_csv_columns(external, usecols)
+    e = e.rename(columns=rename_map)
     # try to ensure year numeric if present
-    for c in ["year","Year","YEAR"]:
-        if c in e.columns:
-            e[c if c=="year" else "year"] = pd.to_numeric(e[c], errors="coerce")
-            if c != "year":
-                e = e.rename(columns={c:"year"})
-            break
-    # Normalize country keys if present
-    if "country_iso3" not in e.columns:
-        for c in ["iso_code","ISO3","iso3","Code"]:
-            if c in e.columns:
-                e = e.rename(columns={c:"country_iso3"})
-                break
+    if "year" in e.columns:
+        e["year"] = pd.to_numeric(e["year"], errors="coerce", downcast="integer")
     joined = join_external(b, e, on=key_cols)
-    joined.to_parquet(out, index=False)
+    write_parquet(joined, out)
     typer.echo(f"Wrote joined dataset -> {out}")
 
 if __name__ == "__main__":
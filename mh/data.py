@@ -1,31 +1,101 @@
-
 from __future__ import annotations
+import csv
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 import pandas as pd
 import numpy as np
 from .config import ColumnConfig, CANONICAL_COLUMNS
 from .utils import to_iso3, ensure_numeric
 
+PREVALENCE_COLUMNS = [c for c in CANONICAL_COLUMNS if c.startswith("prevalence_")]
+
+def read_csv_header(path: str) -> list[str]:
+    with open(path, "r", newline="", encoding="utf-8-sig") as fh:
+        return next(csv.reader(fh), [])
+
+def read_csv_columns(path: str, columns: Optional[list[str]] = None) -> pd.DataFrame:
+    # pyarrow skips columns outside `columns` while tokenizing; None reads them all
+    try:
+        import pyarrow.csv as pacsv
+        from pyarrow.csv import ReadOptions, ConvertOptions
+
+        table = pacsv.read_csv(
+            path,
+            read_options=ReadOptions(use_threads=True),
+            convert_options=ConvertOptions(include_columns=columns or [], strings_can_be_null=True),
+        )
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    except (ImportError, ValueError):
+        return pd.read_csv(path, usecols=columns)
+
+def _canonical_arrow_types(pa) -> dict:
+    # Years fit in 16 bits; prevalence rates are percentages, for which float32's
+    # ~7 significant digits suffice (scikit-learn and statsmodels accept float32).
+    return {
+        c: pa.int16() if c == "year" else pa.float32() if c in PREVALENCE_COLUMNS else pa.string()
+        for c in CANONICAL_COLUMNS
+    }
+
+def _read_csv_arrow(path: str, cfg: ColumnConfig) -> pd.DataFrame:
+    # Multi-threaded pyarrow parse with canonical column types enforced up front.
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    from pyarrow.csv import ReadOptions, ConvertOptions
+
+    mapping = cfg.canonicalize(read_csv_header(path))
+    canonical_types = _canonical_arrow_types(pa)
+    convert_opts = ConvertOptions(
+        column_types={raw: canonical_types[canon] for raw, canon in mapping.items() if canon in canonical_types},
+        include_columns=[raw for raw, canon in mapping.items() if canon in canonical_types],
+        strings_can_be_null=True,  # blank cells become NA, as with pd.read_csv
+    )
+    table = pacsv.read_csv(
+        path,
+        read_options=ReadOptions(use_threads=True, block_size=64 << 20),
+        convert_options=convert_opts,
+    )
+    table = table.rename_columns([mapping.get(c, c) for c in table.column_names])
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+def _to_canonical_arrow_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    # Give the pandas fallback the same dtypes the Arrow reader produces
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return df
+    types = _canonical_arrow_types(pa)
+    for c in df.columns:
+        if types[c] == pa.string():
+            df[c] = df[c].where(df[c].isna(), df[c].astype(str))
+    return df.astype({c: pd.ArrowDtype(types[c]) for c in df.columns})
+
 def ingest_csv(path: str, config_path: str) -> pd.DataFrame:
     cfg = ColumnConfig.from_yaml(config_path)
-    df = pd.read_csv(path)
-    mapping = cfg.canonicalize(df.columns.tolist())
-    df = df.rename(columns=mapping)
+    try:
+        df = _read_csv_arrow(path, cfg)
+        typed = True
+    except (ImportError, ValueError):
+        # pyarrow missing or values that don't parse as the canonical types
+        df = pd.read_csv(path)
+        df = df.rename(columns=cfg.canonicalize(df.columns.tolist()))
+        typed = False
     # Derive total prevalence when only sex-specific columns are present
     if "prevalence_total" not in df.columns and {"prevalence_male", "prevalence_female"}.issubset(df.columns):
-        df["prevalence_total"] = df[["prevalence_male", "prevalence_female"]].mean(axis=1)
+        df["prevalence_total"] = df[["prevalence_male", "prevalence_female"]].mean(axis=1).astype(df["prevalence_male"].dtype)
     # Keep only canonical columns that exist
     keep = [c for c in CANONICAL_COLUMNS if c in df.columns]
-    df = df[keep].copy()
-    # Standardize data types
-    if "year" in df:
-        df["year"] = pd.to_numeric(df["year"], errors="coerce").astype("Int64")
-    for col in ["prevalence_total","prevalence_male","prevalence_female",
-                "prevalence_depression","prevalence_anxiety"]:
-        if col in df:
-            df[col] = pd.to_numeric(df[col], errors="coerce")
+    # Arrow-typed frames aren't mutated below, so the selection needn't copy
+    df = df.loc[:, keep] if typed else df[keep].copy()
+    # Standardize data types (already enforced by the arrow reader)
+    if not typed:
+        if "year" in df:
+            df["year"] = pd.to_numeric(df["year"], errors="coerce").astype("Int16")
+        df = ensure_numeric(df, PREVALENCE_COLUMNS)
+        prevalence = [c for c in PREVALENCE_COLUMNS if c in df]
+        df[prevalence] = df[prevalence].astype("float32")
+        df = _to_canonical_arrow_dtypes(df)
     if "country" in df:
-        df["country_iso3"] = to_iso3(df["country"])
+        df = df.assign(country_iso3=to_iso3(df["country"]))
     return df
 
 def clean(df: pd.DataFrame) -> pd.DataFrame:
@@ -34,8 +104,18 @@ def clean(df: pd.DataFrame) -> pd.DataFrame:
         if c not in df:
             raise ValueError(f"Missing required column '{c}'. Check your columns.yaml mapping and ingest step.")
     df = df.dropna(subset=["country_iso3","year"]).copy()
-    # Deduplicate
-    df = df.drop_duplicates(subset=[c for c in df.columns if c != "sex"])
+    # Deduplicate. Full-row duplicates always share (country_iso3, year), so hash
+    # that narrow key first and only compare every column on colliding rows.
+    # Long (per-sex) data repeats every key once per sex, so the narrow pass
+    # can't prune anything there; use a single full-width drop_duplicates.
+    full = [c for c in df.columns if c != "sex"]
+    if "sex" in df.columns:
+        return df.drop_duplicates(subset=full)
+    collide = df.duplicated(subset=["country_iso3","year"], keep=False).to_numpy()
+    if collide.any():
+        dup = np.zeros(len(df), dtype=bool)
+        dup[collide] = df.loc[collide].duplicated(subset=full).to_numpy()
+        df = df.loc[~dup]
     return df
 
 def gender_gap(df: pd.DataFrame) -> pd.DataFrame:
@@ -45,23 +125,22 @@ def gender_gap(df: pd.DataFrame) -> pd.DataFrame:
     keys = ["country","country_iso3","year"]
     indicators = ["prevalence_total","prevalence_depression","prevalence_anxiety"]
     # First try the long format (sex column available)
-    if "sex" in df.columns:
-        for name in indicators:
-            if {"sex", name}.issubset(df.columns):
-                wide = df.pivot_table(index=keys, columns="sex", values=name, aggfunc="mean")
-                normalized_cols = {c: str(c).lower() for c in wide.columns}
-                wide = wide.rename(columns=normalized_cols)
-                if {"female", "male"}.issubset(wide.columns):
-                    gap_col = name + "_gap_fm"
-                    if gap_col in produced:
-                        continue
-                    wide[gap_col] = wide["female"] - wide["male"]
-                    part = wide.reset_index()[keys + [gap_col]]
-                    out.append(part)
-                    produced.add(gap_col)
+    present = [name for name in indicators if name in df.columns]
+    if "sex" in df.columns and present:
+        # One grouping pass for all indicators instead of a pivot per indicator
+        # Normalize sex labels before grouping so "Male"/"male" land in one group
+        sex = df["sex"].where(df["sex"].isna(), df["sex"].astype(str).str.lower())
+        means = df.assign(sex=sex).groupby(keys + ["sex"], observed=True, sort=False)[present].mean()
+        wide = means.unstack("sex").dropna(how="all").sort_index()
+        if {"female", "male"}.issubset(wide.columns.get_level_values("sex")):
+            gaps = wide.xs("female", level="sex", axis=1) - wide.xs("male", level="sex", axis=1)
+            gaps.columns = [c + "_gap_fm" for c in gaps.columns]
+            out.append(gaps)
+            produced.update(gaps.columns)
 
     # Fallback for wide datasets that already have *_male/*_female columns
     male_cols = [c for c in df.columns if c.endswith("_male")]
+    pairs = []
     for male_col in male_cols:
         base = male_col[:-5]
         female_col = f"{base}_female"
@@ -74,18 +153,86 @@ def gender_gap(df: pd.DataFrame) -> pd.DataFrame:
         gap_name = indicator_name + "_gap_fm"
         if gap_name in produced:
             continue
-        part = df[keys].copy()
-        part[gap_name] = df[female_col] - df[male_col]
-        out.append(part)
+        pairs.append((gap_name, male_col, female_col))
         produced.add(gap_name)
+    if pairs:
+        by_key = df.set_index(keys)
+
+        def _gap(pair):
+            gap_name, male_col, female_col = pair
+            return gap_name, by_key[female_col] - by_key[male_col]
+
+        # Independent vectorized subtractions; numpy releases the GIL, so threads suffice
+        if len(pairs) > 1:
+            with ThreadPoolExecutor() as ex:
+                results = list(ex.map(_gap, pairs))
+        else:
+            results = [_gap(pairs[0])]
+        # Row-aligned with df, so every gap shares the same key index
+        out.append(pd.concat(dict(results), axis=1))
 
     if not out:
         raise ValueError("Sex-stratified columns not found. Provide 'sex' column or *_male/*_female pairs.")
-    # Merge all gaps
-    res = out[0]
-    for part in out[1:]:
-        res = pd.merge(res, part, on=["country","country_iso3","year"], how="outer")
+    # Align all gaps on the key index in a single pass
+    if len(out) == 1:
+        res = out[0]
+    elif all(part.index.is_unique for part in out):
+        res = pd.concat(out, axis=1, join="outer").sort_index()
+    else:
+        # Per-sex rows carrying *_male/*_female columns repeat keys, which concat can't align
+        res = out[0].join(out[1], how="outer")
+    return res.reset_index()
+
+# Joins whose row-count product exceeds this use Arrow's multithreaded hash join.
+ARROW_JOIN_MIN_PRODUCT = 5_000_000
+
+def _join_external_arrow(base: pd.DataFrame, external: pd.DataFrame, on: list[str]) -> Optional[pd.DataFrame]:
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return None
+    left_id, right_id = "__mh_left_row__", "__mh_right_row__"
+    try:
+        # pd.merge matches null keys to each other, Arrow never does; leave those to pandas
+        if base[on].isna().any(axis=None) or external[on].isna().any(axis=None):
+            return None
+        left = pa.Table.from_pandas(base.assign(**{left_id: np.arange(len(base))}), preserve_index=False)
+        right = pa.Table.from_pandas(external.assign(**{right_id: np.arange(len(external))}), preserve_index=False)
+        # Hash join needs identical key types; pandas merge would have upcast
+        for k in on:
+            want = left.schema.field(k).type
+            if right.schema.field(k).type != want:
+                right = right.set_column(right.schema.get_field_index(k), k, right[k].cast(want))
+        joined = left.join(right, keys=on, join_type="left outer", left_suffix="_x", right_suffix="_y", use_threads=True)
+    except (pa.ArrowException, ValueError, KeyError):
+        return None
+    # Arrow doesn't preserve row order; restore pd.merge's (left row, right row) order
+    joined = joined.sort_by([(left_id, "ascending"), (right_id, "ascending")])
+    unmatched = joined[right_id].is_null().to_numpy(zero_copy_only=False)
+    res = joined.drop_columns([left_id, right_id]).to_pandas()
+    # Restore the dtypes pd.merge keeps: every left column, plus right columns with
+    # extension dtypes (numpy right columns are upcast for NA the same way by both)
+    overlap = (set(base.columns) & set(external.columns)) - set(on)
+    for c in res.columns:
+        if c in on or (c in base.columns and c not in overlap):
+            want = base[c].dtype
+        elif c.endswith("_x") and c[:-2] in overlap:
+            want = base[c[:-2]].dtype
+        else:
+            src = c[:-2] if c.endswith("_y") and c[:-2] in overlap else c
+            want = external[src].dtype
+            if not isinstance(want, pd.api.extensions.ExtensionDtype):
+                # Arrow fills unmatched object cells with None, pd.merge with NaN
+                if want == object and res[c].dtype == object and unmatched.any():
+                    res.loc[unmatched, c] = np.nan
+                continue
+        if res[c].dtype != want:
+            res[c] = res[c].astype(want)
     return res
 
 def join_external(base: pd.DataFrame, external: pd.DataFrame, on: list[str]) -> pd.DataFrame:
+    if len(base) * len(external) > ARROW_JOIN_MIN_PRODUCT:
+        res = _join_external_arrow(base, external, on)
+        if res is not None:
+            return res
     return pd.merge(base, external, on=on, how="left")
@@ -1,11 +1,14 @@
 from __future__ import annotations
 
 import logging
+import os
+import re
+import tempfile
 import warnings
 from functools import lru_cache
+from importlib import metadata
 
 import json
-import numpy as np
 import pandas as pd
 
 try:  # Python 3.9+
@@ -13,69 +16,205 @@ try:  # Python 3.9+
 except ImportError:  # pragma: no cover - fallback for older interpreters
     import importlib_resources as resources  # type: ignore[import]
 
-try:
-    import country_converter as coco
-except ImportError:  # pragma: no cover - optional dependency
-    coco = None  # type: ignore[assignment]
 
-_cc = coco.CountryConverter() if coco else None
-if _cc is not None:
+@lru_cache(maxsize=1)
+def _get_cc():
+    # country_converter loads a sizeable table on construction; defer until first use.
+    try:
+        import country_converter as coco
+    except ImportError:  # pragma: no cover - optional dependency
+        warnings.warn(
+            "country_converter not installed; using bundled ISO3 fallback mapping. "
+            "Install country_converter for more comprehensive coverage.",
+            ImportWarning,
+            stacklevel=3,
+        )
+        return None
     logging.getLogger("country_converter").setLevel(logging.ERROR)
-else:
-    warnings.warn(
-        "country_converter not installed; using bundled ISO3 fallback mapping. "
-        "Install country_converter for more comprehensive coverage.",
-        ImportWarning,
-        stacklevel=2,
-    )
+    return coco.CountryConverter()
+
+
+# Non-alphanumeric ASCII bytes, deleted in one C-level bytes.translate pass.
+_NON_ALNUM_ASCII = bytes(i for i in range(128) if not chr(i).isalnum())
 
 
 def _normalize_key(value: str) -> str:
+    if value.isascii():
+        return value.lower().encode("ascii").translate(None, _NON_ALNUM_ASCII).decode("ascii")
+    # Non-ASCII names (e.g. "Côte d’Ivoire") need unicode-aware filtering
     return "".join(ch for ch in value.lower() if ch.isalnum())
 
 
-@lru_cache(maxsize=1)
-def _fallback_iso_map() -> dict[str, str]:
-    # Lazy-load bundled fallback map generated from CountryConverter metadata.
+def _load_fallback_iso_map() -> dict[str, str]:
+    # Bundled fallback map generated from CountryConverter metadata.
     data = resources.files("mh").joinpath("_country_iso_fallback.json")
     with data.open("r", encoding="utf-8") as fh:
         raw = json.load(fh)
     return {_normalize_key(name): code for name, code in raw.items()}
 
 
+def _shard_by_first_char(mapping: dict[str, str]) -> dict[str, dict[str, str]]:
+    shards: dict[str, dict[str, str]] = {}
+    for key, code in mapping.items():
+        shards.setdefault(key[:1], {})[key] = code
+    return shards
+
+
+# Normalized fallback map, bucketed by the key's first character.
+_FALLBACK_MAP_NORMED = _shard_by_first_char(_load_fallback_iso_map())
+
+
+def _fallback_iso_map() -> dict[str, dict[str, str]]:
+    return _FALLBACK_MAP_NORMED
+
+
+def _fallback_get(key: str) -> str | None:
+    return _fallback_iso_map().get(key[:1], {}).get(key)
+
+
 def _fallback_lookup(name: str) -> str | None:
     if not isinstance(name, str):
         return None
     key = _normalize_key(name)
     if not key:
         return None
-    return _fallback_iso_map().get(key)
+    return _fallback_get(key)
 
 
-def to_iso3(country_series: pd.Series) -> pd.Series:
-    def _map(x):
-        if isinstance(x, str):
-            name = x.strip()
+def _clean_code(code) -> str | None:
+    if isinstance(code, (list, tuple)):
+        code = code[0] if len(code) else None
+    if not isinstance(code, str) or code.lower().strip() in {"not found", "notfound", ""}:
+        return None
+    return code
+
+
+def _lookup_iso3(name: str) -> str | None:
+    code: str | None = None
+    cc = _get_cc()
+    if cc is not None:
+        try:
+            code = cc.convert(names=name, to="ISO3", not_found=None)
+        except Exception:  # pragma: no cover - defensive guard
+            code = None
+    code = _clean_code(code)
+    if code is None:
+        code = _fallback_lookup(name)
+    return code
+
+
+def _convert_iso3(names: list[str]) -> dict[str, str]:
+    # Resolve each unique name once; country_converter is much faster in batch.
+    if len(names) == 1:
+        code = _lookup_iso3(names[0])
+        return {names[0]: code} if code else {}
+    codes: list = [None] * len(names)
+    cc = _get_cc()
+    if cc is not None and names:
+        try:
+            codes = cc.convert(names=names, to="ISO3", not_found=None)
+        except Exception:  # pragma: no cover - defensive guard
+            codes = [None] * len(names)
+    mapping: dict[str, str] = {}
+    misses: list[str] = []
+    for name, code in zip(names, codes):
+        code = _clean_code(code)
+        if code is None:
+            misses.append(name)
         else:
-            name = ""
-        if not name:
-            return np.nan
+            mapping[name] = code
+    for name in misses:
+        code = _fallback_get(_normalize_key(name))
+        if code:
+            mapping[name] = code
+    return mapping
 
-        code: str | None = None
-        if _cc is not None:
-            try:
-                code = _cc.convert(names=name, to="ISO3", not_found=None)
-            except Exception:  # pragma: no cover - defensive guard
-                code = None
-            if isinstance(code, (list, tuple)):
-                code = code[0] if len(code) else None
-            if isinstance(code, str) and code.lower().strip() in {"not found", "notfound", ""}:
-                code = None
-        if not isinstance(code, str) or not code.strip():
-            code = _fallback_lookup(name)
-        return code if isinstance(code, str) and code else np.nan
 
-    return country_series.astype(str).map(_map)
+def _iso3_cache_path() -> str:
+    base = os.environ.get("MH_CACHE_DIR") or os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "mh"
+    )
+    return os.path.join(base, "iso3.json")
+
+
+# Bump when the cache layout or what gets stored changes, discarding old files.
+_ISO3_CACHE_FORMAT = 2
+_ISO3_CODE = re.compile(r"^[A-Z]{3}$")
+
+
+def _cc_version() -> str | None:
+    # Read from package metadata so a warm cache never constructs the converter.
+    try:
+        return metadata.version("country_converter")
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def _load_iso3_cache(version: str) -> dict[str, str]:
+    try:
+        with open(_iso3_cache_path(), "r", encoding="utf-8") as fh:
+            raw = json.load(fh)
+    except (OSError, ValueError):
+        return {}
+    # Resolutions from another country_converter release may differ; start over.
+    if (
+        not isinstance(raw, dict)
+        or raw.get("format") != _ISO3_CACHE_FORMAT
+        or raw.get("country_converter") != version
+    ):
+        return {}
+    names = raw.get("names")
+    return names if isinstance(names, dict) else {}
+
+
+def _store_iso3_cache(version: str, names: dict[str, str]) -> None:
+    path = _iso3_cache_path()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            json.dump({"format": _ISO3_CACHE_FORMAT, "country_converter": version, "names": names}, fh)
+        os.replace(tmp, path)  # atomic, so concurrent runs never see a partial file
+    except OSError:  # pragma: no cover - read-only home, full disk, ...
+        pass
+
+
+def _resolve_iso3(names: list[str]) -> dict[str, str]:
+    # Reuse resolutions from earlier runs (keyed by the exact stripped name) and only
+    # send unseen names to country_converter. Without it there is nothing worth caching.
+    version = _cc_version()
+    if version is None:
+        return _convert_iso3(names)
+    cache = _load_iso3_cache(version)
+    mapping: dict[str, str] = {}
+    todo: list[str] = []
+    for name in names:
+        code = cache.get(name)
+        if code:
+            mapping[name] = code
+        else:
+            todo.append(name)
+    if todo:
+        resolved = _convert_iso3(todo)
+        mapping.update(resolved)
+        # Persist only real ISO3 codes; country_converter passes unknown names
+        # through unchanged and those must not outlive this run.
+        fresh = {
+            name: code for name, code in resolved.items()
+            if code != name and _ISO3_CODE.match(code)
+        }
+        if fresh:
+            _store_iso3_cache(version, {**cache, **fresh})
+    return mapping
+
+
+def to_iso3(country_series: pd.Series) -> pd.Series:
+    # Stringify only present values; missing names would otherwise become "nan"/"<NA>"
+    s = country_series.where(country_series.isna(), country_series.astype(str)).astype(object)
+    s = s.str.strip()
+    uniq = [name for name in pd.unique(s) if isinstance(name, str) and name]
+    mapping = _resolve_iso3(uniq)
+    return s.map(mapping)
 
 
 def coalesce_first(df: pd.DataFrame, cols: list[str], out: str) -> pd.DataFrame:
@@ -87,9 +226,10 @@ def coalesce_first(df: pd.DataFrame, cols: list[str], out: str) -> pd.DataFrame:
 
 
 def ensure_numeric(df: pd.DataFrame, cols: list[str]) -> pd.DataFrame:
-    for c in cols:
-        if c in df:
-            df[c] = pd.to_numeric(df[c], errors="coerce")
+    # Coerce all present columns in one block assignment
+    present = [c for c in cols if c in df]
+    if present:
+        df[present] = df[present].apply(pd.to_numeric, errors="coerce")
     return df
 
 
@@ -100,11 +240,96 @@ def latest_year(df: pd.DataFrame) -> int | None:
     return int(vals.max()) if len(vals) else None
 
 
-def read_parquet_safe(path: str, columns: list[str] | None = None) -> pd.DataFrame:
+def write_parquet(df: pd.DataFrame, path: str) -> None:
+    """
+    Write `df` as ZSTD-compressed parquet, dictionary-encoding the repetitive
+    country/sex columns and sizing row groups for `read_parquet_safe` streaming.
+    """
+    dict_cols = [c for c in ("country", "country_iso3", "sex") if c in df.columns]
+    df.to_parquet(
+        path,
+        index=False,
+        engine="pyarrow",
+        compression="zstd",
+        compression_level=3,
+        use_dictionary=dict_cols,
+        row_group_size=256_000,
+    )
+
+
+def _parquet_stream_threshold() -> int:
+    # Files above this size (MB, overridable via MH_PARQUET_STREAM_MB) are streamed.
+    try:
+        mb = float(os.environ.get("MH_PARQUET_STREAM_MB", "512"))
+    except ValueError:
+        mb = 512.0
+    return int(mb * (1 << 20))
+
+
+def _should_stream(path: str) -> bool:
+    # File-like objects (BytesIO, open handles) have no size on disk to check
+    if not isinstance(path, (str, os.PathLike)):
+        return False
+    try:
+        return os.path.getsize(path) > _parquet_stream_threshold()
+    except OSError:  # remote URLs, directories of parts, etc.
+        return False
+
+
+def _memory_map(path: str) -> bool:
+    # Only map local files; remote filesystems (s3://, gs://, ...) and file-like
+    # objects are read normally.
+    if not isinstance(path, (str, os.PathLike)):
+        return False
+    return "://" not in str(os.fspath(path))
+
+
+def _read_parquet_batches(path: str, columns: list[str] | None, batch_rows: int) -> pd.DataFrame:
+    import pyarrow as pa  # type: ignore[import]
+    import pyarrow.parquet as pq  # type: ignore[import]
+
+    pf = pq.ParquetFile(path, memory_map=_memory_map(path))
+    schema = pf.schema_arrow
+    if columns:
+        missing = [c for c in columns if c not in schema.names]
+        if missing:
+            raise KeyError(f"Columns not found in parquet file: {missing}")
+        # Keep a stored pandas index, as pd.read_parquet(columns=...) does
+        index_cols = [
+            c for c in (schema.pandas_metadata or {}).get("index_columns", [])
+            if isinstance(c, str) and c not in columns
+        ]
+        columns = list(columns) + index_cols
+        schema = pa.schema([schema.field(c) for c in columns], metadata=schema.metadata)
+    batches = pf.iter_batches(batch_size=batch_rows, columns=columns)
+    # Peak memory is still the whole (column-subset) table; self_destruct only
+    # frees each Arrow column once pandas has converted it.
+    table = pa.Table.from_batches(batches, schema=schema)
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def parquet_columns(path: str) -> list[str]:
+    """Column names from the parquet footer, without reading any data."""
+    import pyarrow.parquet as pq  # type: ignore[import]
+
+    return pq.read_schema(path).names
+
+
+def read_parquet_safe(
+    path: str, columns: list[str] | None = None, batch_rows: int | None = None
+) -> pd.DataFrame:
     """
     Read a parquet file with a defensive fallback for environments where
     pyarrow's dataset reader raises `Repetition level histogram size mismatch`.
+
+    Large files (see `MH_PARQUET_STREAM_MB`), or any file when `batch_rows` is
+    given, are decoded in record batches of only the requested columns. The
+    batches still form one Arrow table; the saving is that its buffers are
+    released column by column while pandas takes them over, rather than the
+    Arrow and pandas copies coexisting in full.
     """
+    if batch_rows is not None or _should_stream(path):
+        return _read_parquet_batches(path, columns, batch_rows or 100_000)
     try:
         return pd.read_parquet(path, columns=columns)
     except OSError as err:
@@ -121,15 +346,16 @@ def read_parquet_safe(path: str, columns: list[str] | None = None) -> pd.DataFra
             import pyarrow.parquet as pq  # type: ignore[import]
         except ImportError as exc:  # pragma: no cover - should not happen given requirements
             raise err from exc
+        mmap = _memory_map(path)
         try:
-            table = pq.read_table(path, use_legacy_dataset=True, use_threads=False)
+            table = pq.read_table(path, use_legacy_dataset=True, memory_map=mmap, use_threads=True)
         except TypeError:
-            table = pq.read_table(path, use_threads=False)
+            table = pq.read_table(path, memory_map=mmap, use_threads=True)
         except OSError as err2:
             if "Repetition level histogram size mismatch" not in str(err2):
                 raise
             try:
-                table = pq.ParquetFile(path).read(use_threads=False)
+                table = pq.ParquetFile(path, memory_map=mmap).read(use_threads=True)
             except OSError as err3:
                 if "Repetition level histogram size mismatch" not in str(err3):
                     raise
@@ -138,7 +364,7 @@ def read_parquet_safe(path: str, columns: list[str] | None = None) -> pd.DataFra
                     return pd.read_parquet(path, columns=columns, engine="fastparquet")
                 except Exception:
                     raise err3
-        frame = table.to_pandas()
+        frame = table.to_pandas(split_blocks=True)
         if columns:
             missing = [c for c in columns if c not in frame.columns]
             if missing: